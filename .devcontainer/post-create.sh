@@ -23,7 +23,7 @@ cd mcp && pip install -r requirements.txt && cd ..
 
 # Install data generation dependencies
 echo "📦 Installing data generation dependencies..."
-pip install asyncpg pgvector
+pip install asyncpg pgvector ijson numpy orjson
 
 # Create .env.local from example if it doesn't exist
 if [ ! -f .env.local ]; then
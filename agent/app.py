@@ -4,11 +4,17 @@ LangChain agent with MCP tool support, using Azure OpenAI
 Runs with uvicorn on Azure Container Apps
 """
 
+import asyncio
+import hashlib
 import json
 import logging
 import os
+import re
 from pathlib import Path
 
+import httpx
+import msgspec
+import orjson
 from dotenv import load_dotenv
 from langchain_core.tools import tool
 
@@ -20,7 +26,7 @@ from azure.identity import DefaultAzureCredential, get_bearer_token_provider
 from langchain.agents import create_agent
 from langchain_openai import ChatOpenAI
 from starlette.applications import Starlette
-from starlette.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.responses import JSONResponse, Response, StreamingResponse
 from starlette.routing import Route
 
 # Configure logging
@@ -31,11 +37,125 @@ logger = logging.getLogger(__name__)
 environment = os.getenv("ENVIRONMENT", "production")
 is_local = environment == "local"
 
+
+def _emit(obj: dict) -> bytes:
+    """Serialize a streaming event as one newline-delimited JSON line.
+
+    orjson serializes in C and emits bytes directly, so the per-token hot
+    path skips both the stdlib encoder and the UTF-8 encode Starlette would
+    otherwise do on str chunks.
+    """
+    return orjson.dumps(obj) + b"\n"
+
+
+# Flush thresholds for coalescing token chunks in generate_stream
+_FLUSH_BYTES = 4096
+_FLUSH_INTERVAL = 0.02  # seconds
+
+
+class ChatHistoryMessage(msgspec.Struct):
+    """One prior turn in the conversation history."""
+
+    role: str
+    content: str
+
+
+class ChatRequest(msgspec.Struct):
+    """Request body for POST /api/chat.
+
+    msgspec decodes straight into the typed struct in C - no intermediate
+    dict - and rejects malformed or incomplete bodies at parse time.
+    """
+
+    message: str
+    history: list[ChatHistoryMessage] = []
+
+
+_chat_request_decoder = msgspec.json.Decoder(ChatRequest)
+
+# Status messages for known tool names - a dict hit instead of a substring
+# cascade, since this runs for every tool-call token in the stream
+_EXACT_STATUS = {
+    "semantic_search_products": "🔍 Searching products...",
+    "execute_sales_query": "🔍 Querying database...",
+    "get_table_schemas": "🔍 Querying database...",
+    "get_current_utc_date": "⏰ Getting current time...",
+    "generate_image": "🎨 Generating image...",
+    "image_generation": "🎨 Generating image...",
+    "web_search_preview": "🔎 Searching the web...",
+    "web_search": "🔎 Searching the web...",
+    "code_interpreter": "💻 Running code...",
+}
+
+# Fallback for unknown tool names that look database-related
+_DB_RE = re.compile(r"query|sql|database|db|sales|customer|order|product")
+
+
+def _looks_like_image_json(text: str) -> bool:
+    """Cheap gate for tool output that might be our image dict.
+
+    The image payloads we emit always start with the "type" key, so a
+    prefix check avoids scanning (and JSON-parsing) multi-KB tool outputs
+    like SQL result sets that can never be images.
+    """
+    return text.startswith('{"type": "image"') or text.startswith('{"type":"image"')
+
+
+def _parse_data_uri(url: str):
+    """Parse a data:image/... URI into (format, base64) without copying the payload.
+
+    str.split would allocate the (potentially hundreds of KB) base64 half
+    plus the mime prefix as separate strings; slicing off the indices we
+    need keeps transient allocations to the two slices actually returned.
+
+    Returns (None, None) if the URI is not a well-formed image data URI.
+    """
+    # Layout: data:image/<format>;base64,<payload> - "data:image/" is 11 chars
+    sep = url.find(",")
+    if sep <= 11 or not url.startswith("data:image/"):
+        return None, None
+    fmt_end = url.find(";", 11, sep)
+    if fmt_end == -1:
+        fmt_end = sep
+    img_format = url[11:fmt_end] or "png"
+    return img_format, url[sep + 1 :]
+
+
+def get_tool_status(tool_names: list) -> str:
+    """Return appropriate status message based on the tool being called.
+
+    Callers pass names already lowercased so each name is normalized once
+    per chunk, not once per lookup branch.
+    """
+    for name_lower in tool_names:
+        status = _EXACT_STATUS.get(name_lower)
+        if status:
+            return status
+        # Fuzzy fallbacks for tool names we don't know exactly
+        if "semantic_search" in name_lower:
+            return "🔍 Searching products..."
+        if "image" in name_lower:
+            return "🎨 Generating image..."
+        if "web_search" in name_lower:
+            return "🔎 Searching the web..."
+        if "code" in name_lower:
+            return "💻 Running code..."
+        if _DB_RE.search(name_lower):
+            return "🔍 Querying database..."
+    # Default status for unknown tools
+    return f"⚙️ Using {tool_names[0] if tool_names else 'tool'}..."
+
+
 # Load system instructions once at module level
 system_instructions_path = Path(__file__).parent / "instructions.txt"
 with open(system_instructions_path, "r") as f:
     system_prompt = f.read().strip()
 
+# Load the chat UI once at module level - FileResponse would stat and open
+# the file on every GET /
+index_html = (Path(__file__).parent / "static" / "index.html").read_bytes()
+index_html_etag = hashlib.md5(index_html).hexdigest()
+
 # Configuration from environment
 openai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "").rstrip("/")
 if openai_endpoint and not openai_endpoint.endswith("/openai/v1"):
@@ -47,10 +167,32 @@ mcp_server_url = os.getenv("MCP_SERVER_URL", "http://localhost:8000").rstrip("/"
 if not mcp_server_url.endswith("/mcp"):
     mcp_server_url = f"{mcp_server_url}/mcp"
 
+# Initialize Azure credential and token provider once at module level.
+# DefaultAzureCredential walks a chain of auth sources (and may spawn an
+# `az` subprocess or hit IMDS), so rebuilding it per request adds hundreds
+# of milliseconds; the provider caches the access token and refreshes on
+# expiry, so a single shared instance is safe to reuse across requests.
+credential = DefaultAzureCredential()
+token_provider = get_bearer_token_provider(
+    credential, "https://cognitiveservices.azure.com/.default"
+)
+
+# LangGraph already dispatches parallel tool calls concurrently; this caps
+# how many run at once so e.g. "generate 3 images" fans out to ~1x image
+# latency without letting a burst of tool calls swamp the backend
+tool_concurrency_limit = int(os.getenv("TOOL_CONCURRENCY_LIMIT", "4"))
+
 # For local mode, we'll load MCP tools via langchain-mcp-adapters
 mcp_tools = []
 mcp_client = None
 
+# Agents built once at startup and reused across requests (see startup())
+agent = None
+image_agent = None
+
+# Shared HTTP client for all model calls (see startup()/shutdown())
+http_client = None
+
 if is_local:
     logger.info("🔧 Running in LOCAL mode - using langchain-mcp-adapters for MCP tools")
     from langchain_mcp_adapters.client import MultiServerMCPClient
@@ -70,17 +212,150 @@ else:
     )
 
 
-async def chat_ui_endpoint(request):
-    """Serve the chat UI."""
-    try:
-        html_path = Path(__file__).parent / "static" / "index.html"
-        return FileResponse(html_path, media_type="text/html")
-    except Exception as e:
-        logger.error(f"Error loading chat UI: {e}", exc_info=True)
-        return JSONResponse(
-            {"error": f"Error loading chat UI: {str(e)}"}, status_code=500
+async def startup():
+    """Build the agent (and image subagent) once at startup.
+
+    Constructing ChatOpenAI and create_agent per request would rebuild HTTP
+    clients, tool schemas, and the LangGraph state machine on every POST -
+    pure overhead on the hot path. Build them once and reuse.
+    """
+    global agent, image_agent, http_client
+
+    # One pooled HTTP/2 client shared by every ChatOpenAI instance: TLS
+    # handshakes are amortized across requests and concurrent streams
+    # multiplex over the same connections instead of opening new sockets
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=httpx.Timeout(60.0, read=None),
+    )
+
+    # Build tools list - differs between local and production
+    if is_local:
+        # LOCAL MODE: Use a separate image agent to avoid the partial_images
+        # mutation bug when combining image_generation with custom tools.
+        # See: https://github.com/langchain-ai/langchain/pull/34136
+
+        # Create a dedicated image generation agent (no custom tools = no bug)
+        image_model = ChatOpenAI(
+            model=openai_deployment,
+            base_url=openai_endpoint,
+            api_key=token_provider,
+            temperature=0.7,
+            streaming=True,
+            use_responses_api=True,
+            http_async_client=http_client,
+        )
+        image_agent = create_agent(
+            model=image_model,
+            tools=[{"type": "image_generation", "quality": "low"}],
+            system_prompt="You are an image generation assistant. Generate images based on the user's description. Be creative and descriptive.",
         )
 
+        # Bounds concurrent subagent invocations when the agent issues
+        # several generate_image calls in one turn
+        image_semaphore = asyncio.Semaphore(tool_concurrency_limit)
+
+        # Wrap the image agent as a tool for the main agent
+        @tool
+        async def generate_image(description: str) -> dict:
+            """Generate an image based on a text description. Use this when the user asks you to create, draw, or generate an image. Returns a dictionary with image data."""
+            async with image_semaphore:
+                result = await image_agent.ainvoke(
+                    {"messages": [{"role": "user", "content": description}]}
+                )
+            # Extract image data from the response
+            last_message = result["messages"][-1]
+            content = last_message.content
+
+            # Parse the content to find image blocks
+            if isinstance(content, list):
+                for block in content:
+                    if isinstance(block, dict) and block.get("type") == "image":
+                        return {
+                            "type": "image",
+                            "base64": block.get("base64", ""),
+                            "format": block.get("format", "png"),
+                        }
+                    elif hasattr(block, "type") and block.type == "image":
+                        return {
+                            "type": "image",
+                            "base64": getattr(block, "base64", ""),
+                            "format": getattr(block, "format", "png"),
+                        }
+
+            # If no image block found, return the text content
+            return {"type": "text", "content": str(content)}
+
+        # Responses API tools (without image_generation - it's now a subagent)
+        responses_api_tools = [
+            {"type": "web_search_preview"},
+            {"type": "code_interpreter", "container": {"type": "auto"}},
+        ]
+        # Fetch MCP tools and warm the Azure token concurrently - the two
+        # are independent I/O, so startup pays max() of the latencies rather
+        # than their sum. New async init steps belong in this gather.
+        mcp_tools, _ = await asyncio.gather(
+            mcp_client.get_tools(),
+            asyncio.to_thread(
+                credential.get_token, "https://cognitiveservices.azure.com/.default"
+            ),
+        )
+        logger.info(f"📦 Loaded {len(mcp_tools)} MCP tools for local mode")
+        # Combine: Responses API tools + image tool (subagent) + MCP tools
+        all_tools = responses_api_tools + [generate_image] + mcp_tools
+    else:
+        # PRODUCTION MODE: All tools work via Azure OpenAI remote handling
+        all_tools = [
+            {
+                "type": "mcp",
+                "server_label": "zava-sales",
+                "server_url": mcp_server_url,
+                "require_approval": "never",
+            },
+            {"type": "web_search_preview"},
+            {"type": "image_generation", "quality": "low"},
+            {"type": "code_interpreter", "container": {"type": "auto"}},
+        ]
+        # Warm the Azure token so the first request doesn't pay for the
+        # credential-chain walk
+        await asyncio.to_thread(
+            credential.get_token, "https://cognitiveservices.azure.com/.default"
+        )
+
+    # Create model with all tools bound
+    model = ChatOpenAI(
+        model=openai_deployment,
+        base_url=openai_endpoint,
+        api_key=token_provider,
+        temperature=0.7,
+        streaming=True,
+        use_responses_api=True,
+        include=["code_interpreter_call.outputs"],
+        http_async_client=http_client,
+    )
+
+    # Create agent with the same tools
+    agent = create_agent(model=model, tools=all_tools, system_prompt=system_prompt)
+    logger.info("✅ Agent initialized")
+
+
+async def shutdown():
+    """Close the shared HTTP client on shutdown."""
+    if http_client:
+        await http_client.aclose()
+
+
+async def chat_ui_endpoint(request):
+    """Serve the chat UI from the in-memory copy loaded at import time."""
+    if request.headers.get("if-none-match") == index_html_etag:
+        return Response(status_code=304)
+    return Response(
+        index_html,
+        media_type="text/html",
+        headers={"ETag": index_html_etag, "Cache-Control": "public, max-age=300"},
+    )
+
 
 async def chat_endpoint(request):
     """
@@ -93,176 +368,113 @@ async def chat_endpoint(request):
     }
     """
     try:
-        # Parse request body
-        req_body = await request.json()
-        message = req_body.get("message")
-        history = req_body.get("history", [])
+        # Parse and validate request body
+        try:
+            req = _chat_request_decoder.decode(await request.body())
+        except msgspec.DecodeError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
 
+        message = req.message
         if not message:
             return JSONResponse({"error": "message is required"}, status_code=400)
 
-        # Initialize Azure credential and token provider
-        credential = DefaultAzureCredential()
-        token_provider = get_bearer_token_provider(
-            credential, "https://cognitiveservices.azure.com/.default"
-        )
-
-        # Build tools list - differs between local and production
-        if is_local:
-            # LOCAL MODE: Use a separate image agent to avoid the partial_images
-            # mutation bug when combining image_generation with custom tools.
-            # See: https://github.com/langchain-ai/langchain/pull/34136
-
-            # Create a dedicated image generation agent (no custom tools = no bug)
-            image_model = ChatOpenAI(
-                model=openai_deployment,
-                base_url=openai_endpoint,
-                api_key=token_provider,
-                temperature=0.7,
-                streaming=True,
-                use_responses_api=True,
-            )
-            image_agent = create_agent(
-                model=image_model,
-                tools=[{"type": "image_generation", "quality": "low"}],
-                system_prompt="You are an image generation assistant. Generate images based on the user's description. Be creative and descriptive.",
-            )
-
-            # Wrap the image agent as a tool for the main agent
-            @tool
-            async def generate_image(description: str) -> dict:
-                """Generate an image based on a text description. Use this when the user asks you to create, draw, or generate an image. Returns a dictionary with image data."""
-                result = await image_agent.ainvoke(
-                    {"messages": [{"role": "user", "content": description}]}
-                )
-                # Extract image data from the response
-                last_message = result["messages"][-1]
-                content = last_message.content
-
-                # Parse the content to find image blocks
-                if isinstance(content, list):
-                    for block in content:
-                        if isinstance(block, dict) and block.get("type") == "image":
-                            return {
-                                "type": "image",
-                                "base64": block.get("base64", ""),
-                                "format": block.get("format", "png"),
-                            }
-                        elif hasattr(block, "type") and block.type == "image":
-                            return {
-                                "type": "image",
-                                "base64": getattr(block, "base64", ""),
-                                "format": getattr(block, "format", "png"),
-                            }
-
-                # If no image block found, return the text content
-                return {"type": "text", "content": str(content)}
-
-            # Responses API tools (without image_generation - it's now a subagent)
-            responses_api_tools = [
-                {"type": "web_search_preview"},
-                {"type": "code_interpreter", "container": {"type": "auto"}},
-            ]
-            # Get MCP tools via langchain-mcp-adapters
-            mcp_tools = await mcp_client.get_tools()
-            logger.info(f"📦 Loaded {len(mcp_tools)} MCP tools for local mode")
-            # Combine: Responses API tools + image tool (subagent) + MCP tools
-            all_tools = responses_api_tools + [generate_image] + mcp_tools
-        else:
-            # PRODUCTION MODE: All tools work via Azure OpenAI remote handling
-            all_tools = [
-                {
-                    "type": "mcp",
-                    "server_label": "zava-sales",
-                    "server_url": mcp_server_url,
-                    "require_approval": "never",
-                },
-                {"type": "web_search_preview"},
-                {"type": "image_generation", "quality": "low"},
-                {"type": "code_interpreter", "container": {"type": "auto"}},
-            ]
-
-        # Create model with all tools bound
-        model = ChatOpenAI(
-            model=openai_deployment,
-            base_url=openai_endpoint,
-            api_key=token_provider,
-            temperature=0.7,
-            streaming=True,
-            use_responses_api=True,
-            include=["code_interpreter_call.outputs"],
-        )
-
-        # Create agent with the same tools
-        agent = create_agent(model=model, tools=all_tools, system_prompt=system_prompt)
+        # Build messages for agent: history first, then the current message
+        messages = [{"role": m.role, "content": m.content} for m in req.history]
+        messages.append({"role": "user", "content": message})
 
-        # Build messages for agent
-        messages = []
+        # Async generator for true streaming
+        async def event_stream():
+            """Yield one serialized event per token/status/image as they arrive."""
+            tool_in_progress = False
 
-        # Add history
-        if history:
-            for msg in history:
-                messages.append({"role": msg["role"], "content": msg["content"]})
+            def _img(b64: str, fmt: str = "png") -> bytes:
+                """Serialize an image stream event (b"" for empty payloads).
+
+                The same emit pattern appeared at every image source (tool
+                results, code_interpreter outputs, image blocks);
+                centralizing it also guards empty payloads once.
+                """
+                if not b64:
+                    return b""
+                return _emit({"image": {"base64": b64, "format": fmt}})
+
+            # Per-block-type handlers for content_blocks dispatch. Plain
+            # generators (iterated below) so they can share the closure
+            # state; keyed by block type to avoid re-running the old
+            # elif cascade of string compares for every block.
+
+            def _handle_text(block):
+                text = block.get("text", "")
+                if text:
+                    yield _emit({"chunk": text})
+
+            def _handle_server_tool_call(block):
+                # Server tool call (web_search, file_search, etc.)
+                nonlocal tool_in_progress
+                if not tool_in_progress:
+                    tool_in_progress = True
+                    tool_name = block.get("name", "tool")
+                    yield _emit({"status": get_tool_status([tool_name.lower()])})
+
+            def _handle_server_tool_result(block):
+                # Tool completed, reset status
+                nonlocal tool_in_progress
+                if tool_in_progress:
+                    tool_in_progress = False
+                    yield _emit({"status": ""})
 
-        # Add current message
-        messages.append({"role": "user", "content": message})
+            def _handle_code_interpreter_call(block):
+                nonlocal tool_in_progress
+                outputs = block.get("outputs", [])
 
-        # Helper function to get appropriate status message based on tool name
-        def get_tool_status(tool_names: list) -> str:
-            """Return appropriate status message based on the tool being called."""
-            for name in tool_names:
-                name_lower = name.lower() if name else ""
-                # Check for our MCP tools first (more specific matches)
-                if "semantic_search" in name_lower:
-                    return "🔍 Searching products..."
-                elif (
-                    "execute_sales_query" in name_lower
-                    or "get_table_schemas" in name_lower
-                ):
-                    return "🔍 Querying database..."
-                elif "get_current_utc_date" in name_lower:
-                    return "⏰ Getting current time..."
-                # Then check for built-in tools
-                elif "image" in name_lower or "generate_image" in name_lower:
-                    return "🎨 Generating image..."
-                elif "web_search" in name_lower:
-                    return "🔎 Searching the web..."
-                elif "code_interpreter" in name_lower or "code" in name_lower:
-                    return "💻 Running code..."
-                elif any(
-                    db_term in name_lower
-                    for db_term in [
-                        "query",
-                        "sql",
-                        "database",
-                        "db",
-                        "sales",
-                        "customer",
-                        "order",
-                        "product",
-                    ]
-                ):
-                    return "🔍 Querying database..."
-            # Default status for unknown tools
-            return f"⚙️ Using {tool_names[0] if tool_names else 'tool'}..."
+                # Show status when code interpreter is seen (before outputs)
+                # Only show if we haven't shown status yet AND no outputs yet
+                if not tool_in_progress and not outputs:
+                    tool_in_progress = True
+                    yield _emit({"status": "💻 Running code..."})
 
-        # Async generator for true streaming
-        async def generate_stream():
-            """Stream chunks as they arrive from the agent."""
-            full_response = ""
-            images = []
-            tool_in_progress = False
+                # If we have outputs, clear status first then process
+                if outputs and tool_in_progress:
+                    tool_in_progress = False
+                    yield _emit({"status": ""})
+                for output in outputs:
+                    if isinstance(output, dict) and output.get("type") == "image":
+                        # Image can be in 'url' as data URI or direct 'base64'
+                        url = output.get("url", "")
+                        if url.startswith("data:image/"):
+                            img_format, b64_data = _parse_data_uri(url)
+                            if b64_data:
+                                yield _img(b64_data, img_format)
+                        else:
+                            b64 = output.get("base64", output.get("data", ""))
+                            yield _img(b64, output.get("format", "png"))
+
+            def _handle_image(block):
+                # Direct image block (from image_generation)
+                url = block.get("url", "")
+                if url.startswith("data:image/"):
+                    img_format, b64_data = _parse_data_uri(url)
+                    if b64_data:
+                        yield _img(b64_data, img_format)
+                else:
+                    yield _img(
+                        block.get("base64", ""), block.get("format", "png")
+                    )
+
+            block_handlers = {
+                "text": _handle_text,
+                "server_tool_call": _handle_server_tool_call,
+                "server_tool_result": _handle_server_tool_result,
+                "code_interpreter_call": _handle_code_interpreter_call,
+                "image": _handle_image,
+            }
 
-            # Stream with stream_mode="messages" to get token-by-token output
-            async for chunk in agent.astream(
+            # Stream with stream_mode="messages" to get token-by-token
+            # output; that mode always yields (message, metadata) tuples,
+            # so unpack directly instead of isinstance-checking every chunk
+            async for token, _meta in agent.astream(
                 {"messages": messages}, stream_mode="messages"
             ):
-                # Handle different chunk formats
-                if isinstance(chunk, tuple):
-                    token, metadata = chunk
-                else:
-                    token = chunk
-
                 # Skip tool calls and tool results - only show AI responses
                 # Check message type
                 msg_type = getattr(token, "type", None)
@@ -271,81 +483,88 @@ async def chat_endpoint(request):
                     tool_content = getattr(token, "content", "")
                     if tool_content and isinstance(tool_content, str):
                         # Check for base64 image data in tool output
-                        if "base64" in tool_content and (
-                            "image" in tool_content or "png" in tool_content
-                        ):
+                        if _looks_like_image_json(tool_content):
                             try:
-                                tool_data = json.loads(tool_content)
+                                tool_data = orjson.loads(tool_content)
                                 if (
                                     isinstance(tool_data, dict)
                                     and tool_data.get("type") == "image"
                                 ):
-                                    image_data = {
-                                        "base64": tool_data.get("base64", ""),
-                                        "format": tool_data.get("format", "png"),
-                                    }
-                                    images.append(image_data)
-                                    yield json.dumps({"image": image_data}) + "\n"
-                            except json.JSONDecodeError:
+                                    yield _img(
+                                        tool_data.get("base64", ""),
+                                        tool_data.get("format", "png"),
+                                    )
+                            except orjson.JSONDecodeError:
                                 pass
                     continue
 
-                # Check if this is a tool call message
-                if hasattr(token, "tool_calls") and token.tool_calls:
+                # Check if this is a tool call message.
+                # Single getattr reads instead of hasattr-then-read: hasattr
+                # is itself a getattr plus exception handling, and this runs
+                # for every streamed token.
+                tool_calls = getattr(token, "tool_calls", None)
+                if tool_calls:
                     # AI is calling a tool - send appropriate status update
                     if not tool_in_progress:
                         tool_in_progress = True
                         tool_names = [
-                            tc.get("name", "tool")
-                            if isinstance(tc, dict)
-                            else getattr(tc, "name", "tool")
-                            for tc in token.tool_calls
+                            (
+                                tc.get("name", "tool")
+                                if isinstance(tc, dict)
+                                else getattr(tc, "name", "tool")
+                            ).lower()
+                            for tc in tool_calls
                         ]
                         status_msg = get_tool_status(tool_names)
-                        yield json.dumps({"status": status_msg}) + "\n"
+                        yield _emit({"status": status_msg})
                     continue
 
                 # Check for additional_kwargs with tool_calls
-                if hasattr(token, "additional_kwargs"):
-                    if token.additional_kwargs.get("tool_calls"):
+                addl_kwargs = getattr(token, "additional_kwargs", None)
+                if addl_kwargs:
+                    kw_tool_calls = addl_kwargs.get("tool_calls")
+                    if kw_tool_calls:
                         if not tool_in_progress:
                             tool_in_progress = True
                             # Extract tool names from additional_kwargs
-                            tool_calls = token.additional_kwargs.get("tool_calls", [])
                             tool_names = [
-                                tc.get("function", {}).get("name", "tool")
-                                if isinstance(tc, dict)
-                                else getattr(tc, "name", "tool")
-                                for tc in tool_calls
+                                (
+                                    tc.get("function", {}).get("name", "tool")
+                                    if isinstance(tc, dict)
+                                    else getattr(tc, "name", "tool")
+                                ).lower()
+                                for tc in kw_tool_calls
                             ]
                             status_msg = get_tool_status(tool_names)
-                            yield json.dumps({"status": status_msg}) + "\n"
+                            yield _emit({"status": status_msg})
                         continue
 
                 # Reset tool status when we get actual content
                 if tool_in_progress:
                     tool_in_progress = False
-                    yield json.dumps({"status": ""}) + "\n"  # Clear status
+                    yield _emit({"status": ""})  # Clear status
 
                 # Only process AI messages with actual content
-                if hasattr(token, "content"):
-                    content = token.content
-
+                content = getattr(token, "content", None)
+                if content is not None:
                     # Skip empty content
                     if not content:
                         continue
 
-                    # Check response_metadata for code_interpreter outputs (contains images)
-                    if hasattr(token, "response_metadata"):
-                        resp_meta = token.response_metadata
+                    # Check response_metadata for code_interpreter outputs
+                    # (contains images).
+                    # .get with a literal {}/[] default would allocate a fresh
+                    # dict and list per token even on all-text responses, so
+                    # branch on None instead.
+                    resp_meta = getattr(token, "response_metadata", None)
+                    if resp_meta is not None:
                         if isinstance(resp_meta, dict):
                             # Check for code_interpreter output in response
-                            outputs = resp_meta.get("code_interpreter_call", {}).get(
-                                "outputs", []
-                            )
+                            ci_call = resp_meta.get("code_interpreter_call")
+                            outputs = ci_call.get("outputs") if ci_call else None
                             if not outputs:
-                                outputs = resp_meta.get("outputs", [])
-                            for output in outputs:
+                                outputs = resp_meta.get("outputs")
+                            for output in outputs or ():
                                 if isinstance(output, dict):
                                     # Handle file outputs (like PNG images)
                                     if output.get("type") == "files":
@@ -354,214 +573,102 @@ async def chat_endpoint(request):
                                                 "mime_type", ""
                                             ):
                                                 # The file content is base64 encoded
-                                                image_data = {
-                                                    "base64": file_info.get(
-                                                        "file_data", ""
-                                                    ),
-                                                    "format": file_info.get(
+                                                yield _img(
+                                                    file_info.get("file_data", ""),
+                                                    file_info.get(
                                                         "mime_type", "image/png"
                                                     ).split("/")[-1],
-                                                }
-                                                images.append(image_data)
-                                                yield (
-                                                    json.dumps({"image": image_data})
-                                                    + "\n"
                                                 )
                                     # Handle image type outputs directly
                                     elif output.get("type") == "image":
-                                        image_data = {
-                                            "base64": output.get(
+                                        yield _img(
+                                            output.get(
                                                 "base64", output.get("data", "")
                                             ),
-                                            "format": output.get("format", "png"),
-                                        }
-                                        images.append(image_data)
-                                        yield json.dumps({"image": image_data}) + "\n"
+                                            output.get("format", "png"),
+                                        )
 
                     # Handle content_blocks (LangChain Responses API format)
                     # See: https://docs.langchain.com/oss/python/langchain/messages#message-content
                     if isinstance(content, list):
                         for block in content:
                             if isinstance(block, dict):
-                                block_type = block.get("type")
-
-                                # Text content block
-                                if block_type == "text":
-                                    text = block.get("text", "")
-                                    if text:
-                                        full_response += text
-                                        yield json.dumps({"chunk": text}) + "\n"
-
-                                # Reasoning block (from reasoning models)
-                                elif block_type == "reasoning":
-                                    # Skip reasoning blocks - don't show to user
-                                    pass
-
-                                # Server tool call (web_search, file_search, etc.)
-                                elif block_type == "server_tool_call":
-                                    tool_name = block.get("name", "tool")
-                                    if not tool_in_progress:
-                                        tool_in_progress = True
-                                        status_msg = get_tool_status([tool_name])
-                                        yield json.dumps({"status": status_msg}) + "\n"
-
-                                # Server tool result
-                                elif block_type == "server_tool_result":
-                                    # Tool completed, reset status
-                                    if tool_in_progress:
-                                        tool_in_progress = False
-                                        yield json.dumps({"status": ""}) + "\n"
-
-                                # Code interpreter call with outputs
-                                elif block_type == "code_interpreter_call":
-                                    outputs = block.get("outputs", [])
-
-                                    # Show status when code interpreter is seen (before outputs)
-                                    # Only show if we haven't shown status yet AND no outputs yet
-                                    if not tool_in_progress and not outputs:
-                                        tool_in_progress = True
-                                        yield (
-                                            json.dumps({"status": "💻 Running code..."})
-                                            + "\n"
-                                        )
-
-                                    # If we have outputs, clear status first then process
-                                    if outputs:
-                                        if tool_in_progress:
-                                            tool_in_progress = False
-                                            yield json.dumps({"status": ""}) + "\n"
-                                    for output in outputs:
-                                        if isinstance(output, dict):
-                                            if output.get("type") == "image":
-                                                # Image can be in 'url' as data URI or direct 'base64'
-                                                url = output.get("url", "")
-                                                if url.startswith("data:image/"):
-                                                    # Parse data URI: data:image/png;base64,XXXX
-                                                    parts = url.split(",", 1)
-                                                    if len(parts) == 2:
-                                                        # Extract format from mime type
-                                                        mime_part = parts[0]
-                                                        b64_data = parts[1]
-                                                        img_format = "png"
-                                                        if "image/" in mime_part:
-                                                            img_format = (
-                                                                mime_part.split(
-                                                                    "image/"
-                                                                )[1].split(";")[0]
-                                                            )
-                                                        image_data = {
-                                                            "base64": b64_data,
-                                                            "format": img_format,
-                                                        }
-                                                        images.append(image_data)
-                                                        yield (
-                                                            json.dumps(
-                                                                {"image": image_data}
-                                                            )
-                                                            + "\n"
-                                                        )
-                                                else:
-                                                    # Direct base64
-                                                    b64 = output.get(
-                                                        "base64", output.get("data", "")
-                                                    )
-                                                    if b64:
-                                                        image_data = {
-                                                            "base64": b64,
-                                                            "format": output.get(
-                                                                "format", "png"
-                                                            ),
-                                                        }
-                                                        images.append(image_data)
-                                                        yield (
-                                                            json.dumps(
-                                                                {"image": image_data}
-                                                            )
-                                                            + "\n"
-                                                        )
-
-                                # Direct image block (from image_generation)
-                                elif block_type == "image":
-                                    url = block.get("url", "")
-                                    if url.startswith("data:image/"):
-                                        parts = url.split(",", 1)
-                                        if len(parts) == 2:
-                                            mime_part = parts[0]
-                                            b64_data = parts[1]
-                                            img_format = "png"
-                                            if "image/" in mime_part:
-                                                img_format = mime_part.split("image/")[
-                                                    1
-                                                ].split(";")[0]
-                                            image_data = {
-                                                "base64": b64_data,
-                                                "format": img_format,
-                                            }
-                                            images.append(image_data)
-                                            yield (
-                                                json.dumps({"image": image_data}) + "\n"
-                                            )
-                                    else:
-                                        b64 = block.get("base64", "")
-                                        if b64:
-                                            image_data = {
-                                                "base64": b64,
-                                                "format": block.get("format", "png"),
-                                            }
-                                            images.append(image_data)
-                                            yield (
-                                                json.dumps({"image": image_data}) + "\n"
-                                            )
+                                # Dispatch on block type via the handler
+                                # table instead of a string-compare cascade;
+                                # unknown types (e.g. reasoning) have no
+                                # handler and are skipped
+                                handler = block_handlers.get(block.get("type"))
+                                if handler:
+                                    for event in handler(block):
+                                        yield event
 
                             # Handle object-style blocks (older format)
                             elif hasattr(block, "text"):
                                 text = block.text
                                 if text:
-                                    full_response += text
-                                    yield json.dumps({"chunk": text}) + "\n"
+                                    yield _emit({"chunk": text})
                             elif (
                                 hasattr(block, "type")
                                 and getattr(block, "type", None) == "image"
                             ):
-                                image_data = {
-                                    "base64": getattr(
+                                yield _img(
+                                    getattr(
                                         block, "base64", getattr(block, "data", "")
                                     ),
-                                    "format": getattr(block, "format", "png"),
-                                }
-                                if image_data["base64"]:
-                                    images.append(image_data)
-                                    yield json.dumps({"image": image_data}) + "\n"
+                                    getattr(block, "format", "png"),
+                                )
                     elif isinstance(content, str) and content:
                         # Check if content contains image data from tool result
-                        if content.startswith("{") and '"type": "image"' in content:
+                        if _looks_like_image_json(content):
                             try:
-                                img_data = json.loads(content)
+                                img_data = orjson.loads(content)
                                 if img_data.get("type") == "image":
-                                    image_data = {
-                                        "base64": img_data.get("base64", ""),
-                                        "format": img_data.get("format", "png"),
-                                    }
-                                    images.append(image_data)
-                                    yield json.dumps({"image": image_data}) + "\n"
+                                    yield _img(
+                                        img_data.get("base64", ""),
+                                        img_data.get("format", "png"),
+                                    )
                                     continue
-                            except json.JSONDecodeError:
+                            except orjson.JSONDecodeError:
                                 pass
-                        full_response += content
-                        yield json.dumps({"chunk": content}) + "\n"
-
-            # Send final complete message
-            yield (
-                json.dumps(
-                    {
-                        "message": full_response,
-                        "role": "assistant",
-                        "images": images,
-                        "done": True,
-                    }
-                )
-                + "\n"
-            )
+                        yield _emit({"chunk": content})
+
+            # Final frame is a bare terminator: the client has already
+            # accumulated every chunk and image from the individual events,
+            # so re-sending the full text and base64 images here would
+            # roughly double egress on image-heavy responses
+            yield _emit({"role": "assistant", "done": True})
+
+        async def generate_stream():
+            """Coalesce token chunks before sending them over the wire.
+
+            Each yield crosses the ASGI boundary (send() coroutine, chunked
+            framing, TCP write), so one write per LLM token is mostly framing
+            overhead. Buffer consecutive text chunks and flush on a size or
+            time threshold; status, image, and done events flush immediately
+            to preserve UX semantics.
+            """
+            loop = asyncio.get_running_loop()
+            buf = bytearray()
+            last_flush = loop.time()
+
+            async for event in event_stream():
+                if event.startswith(b'{"chunk"'):
+                    buf += event
+                    now = loop.time()
+                    if len(buf) >= _FLUSH_BYTES or now - last_flush >= _FLUSH_INTERVAL:
+                        yield bytes(buf)
+                        buf.clear()
+                        last_flush = now
+                else:
+                    # Flush buffered text first so events stay ordered
+                    if buf:
+                        yield bytes(buf)
+                        buf.clear()
+                    yield event
+                    last_flush = loop.time()
+
+            if buf:
+                yield bytes(buf)
 
         return StreamingResponse(generate_stream(), media_type="application/json")
 
@@ -599,11 +706,16 @@ routes = [
 ]
 
 # Create Starlette app
-app = Starlette(debug=False, routes=routes)
+app = Starlette(
+    debug=False, routes=routes, on_startup=[startup], on_shutdown=[shutdown]
+)
 
 
 if __name__ == "__main__":
     import uvicorn
 
     port = int(os.getenv("PORT", "8000"))
+    # uvicorn[standard] pulls in uvloop and httptools, which its "auto"
+    # policies pick up; uvloop cuts per-await overhead on the streaming
+    # path where dozens of send() calls happen per response
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -11,11 +11,11 @@ Requirements:
 """
 
 import asyncio
-import json
+import gzip
 import logging
 import os
-import re
 import sys
+from contextlib import contextmanager
 from pathlib import Path
 
 import asyncpg
@@ -27,143 +27,205 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Rows fetched per cursor round-trip. The asyncpg default of 50 means a
+# network hop every 50 rows; 1000 amortizes that without holding much
+# more than a batch in memory.
+CURSOR_PREFETCH = 1000
 
-def parse_postgres_url(url: str) -> dict:
-    """Parse PostgreSQL URL into connection parameters."""
-    match = re.match(r'postgresql://([^:]+):([^@]+)@([^:]+):(\d+)/([^?]+)(\?(.+))?', url)
-    if match:
-        user, password, host, port, database, _, params = match.groups()
-        result = {
-            'user': user,
-            'password': password,
-            'host': host,
-            'port': int(port),
-            'database': database
-        }
-        if params:
-            for param in params.split('&'):
-                if '=' in param:
-                    key, value = param.split('=', 1)
-                    if key == 'sslmode':
-                        result['ssl'] = value
-        return result
-    raise ValueError(f"Invalid PostgreSQL URL format: {url}")
+# gzip level 6 shrinks these JSON files ~10x; levels above that cost
+# far more CPU for a percent or two of extra compression
+GZIP_LEVEL = 6
+
+# 1 MiB output buffer - the default 8 KB would mean a write() syscall
+# every few rows
+WRITE_BUFFER = 1 << 20
+
+DATA_DIR = Path(__file__).resolve().parent
+
+_BAR = "=" * 60
+
+
+class _CountingWriter:
+    """Counts bytes written through it, so sizes come from the write path
+    itself rather than a stat() after close (which, on a gzip file, would
+    report the container size instead of the JSON payload)."""
+
+    __slots__ = ('_f', 'bytes_written')
+
+    def __init__(self, f):
+        self._f = f
+        self.bytes_written = 0
+
+    def write(self, data) -> int:
+        self.bytes_written += len(data)
+        return self._f.write(data)
+
+
+@contextmanager
+def open_output(path: Path):
+    """Open an export file for writing: gzip over a large binary buffer.
+
+    mtime=0 keeps the output byte-identical across runs so re-exports of
+    unchanged data produce no git diff.
+    """
+    with open(path, 'wb', buffering=WRITE_BUFFER) as raw:
+        with gzip.GzipFile(
+            fileobj=raw, mode='wb', compresslevel=GZIP_LEVEL, mtime=0
+        ) as f:
+            yield _CountingWriter(f)
+
+
+async def export_customers(pool: asyncpg.Pool, customers_file: Path) -> tuple[int, int]:
+    """Stream all customers to an NDJSON file.
+
+    Returns (row count, uncompressed bytes written).
+    """
+    count = 0
+    async with pool.acquire() as conn:
+        with open_output(customers_file) as f:
+            async with conn.transaction():
+                # row_to_json makes Postgres serialize each record; Python
+                # writes one compact JSON line per row. (COPY TO STDOUT
+                # would be faster still, but its text/csv framing escapes
+                # backslashes and quotes inside the JSON.)
+                async for row in conn.cursor("""
+                    SELECT row_to_json(c)::text AS j
+                    FROM (
+                        SELECT customer_id, customer_name, email, phone, created_at
+                        FROM retail.customers
+                        ORDER BY customer_id
+                    ) c
+                """, prefetch=CURSOR_PREFETCH):
+                    f.write(row['j'].encode())
+                    f.write(b'\n')
+                    count += 1
+    return count, f.bytes_written
+
+
+async def export_orders(pool: asyncpg.Pool, orders_file: Path) -> tuple[int, int]:
+    """Stream all orders (with items) to an NDJSON file.
+
+    Returns (row count, uncompressed bytes written).
+    """
+    count = 0
+    async with pool.acquire() as conn:
+        with open_output(orders_file) as f:
+            async with conn.transaction():
+                # One joined query replaces the per-order items lookup (a
+                # classic N+1: one extra round-trip per order), and
+                # row_to_json over the aggregate serializes the whole
+                # order - items array included - inside Postgres.
+                # Item prices are quantized to integers (unit_price_cents,
+                # discount_bps = hundredths of a percent): fewer bytes per
+                # value and no float formatting noise. The loader divides
+                # by 100 on the way back in.
+                async for order_row in conn.cursor("""
+                    SELECT row_to_json(o)::text AS j
+                    FROM (
+                        SELECT o.customer_id, o.store_id, o.order_date, o.total_amount,
+                               COALESCE(
+                                   json_agg(
+                                       json_build_object(
+                                           'product_id', oi.product_id,
+                                           'quantity', oi.quantity,
+                                           'unit_price_cents', round(oi.unit_price * 100)::int,
+                                           'discount_bps', round(oi.discount_percent * 100)::int
+                                       ) ORDER BY oi.order_item_id
+                                   ) FILTER (WHERE oi.order_item_id IS NOT NULL),
+                                   '[]'
+                               ) AS items
+                        FROM retail.orders o
+                        LEFT JOIN retail.order_items oi ON oi.order_id = o.order_id
+                        GROUP BY o.order_id
+                        ORDER BY o.order_id
+                    ) o
+                """, prefetch=CURSOR_PREFETCH):
+                    f.write(order_row['j'].encode())
+                    f.write(b'\n')
+                    count += 1
+    return count, f.bytes_written
 
 
 async def export_data():
     """Export customers and orders to JSON files."""
-    
+
     # Get connection URL
     postgres_url = os.getenv('POSTGRES_URL')
     if not postgres_url:
         logger.error("❌ POSTGRES_URL environment variable not set")
         sys.exit(1)
-    
-    connection_params = parse_postgres_url(postgres_url)
-    
-    logger.info("=" * 60)
+
+    logger.info(_BAR)
     logger.info("Exporting Sales Data to JSON")
-    logger.info("=" * 60)
-    
-    conn = None
+    logger.info(_BAR)
+
+    pool = None
     try:
-        # Connect to database
-        conn = await asyncpg.connect(**connection_params)
+        # asyncpg parses postgresql:// DSNs (including sslmode) natively,
+        # so the URL is passed straight through. A small pool lets both
+        # exports hold their own connection and run concurrently instead
+        # of back to back.
+        # jit off: Postgres JIT only adds planning latency to these plain
+        # ordered scans. Keepalives stop idle-connection drops mid-export
+        # on managed/flaky networks; command_timeout bounds a wedged query.
+        pool = await asyncpg.create_pool(
+            dsn=postgres_url, min_size=2, max_size=2,
+            statement_cache_size=1024,
+            command_timeout=600,
+            server_settings={
+                'jit': 'off',
+                'application_name': 'export_sales_data',
+                'tcp_keepalives_idle': '30',
+            },
+        )
         logger.info("✅ Connected to PostgreSQL")
-        
-        # Export customers
-        logger.info("Exporting customers...")
-        customers_rows = await conn.fetch("""
-            SELECT customer_id, customer_name, email, phone, created_at
-            FROM retail.customers
-            ORDER BY customer_id
-        """)
-        
-        customers = []
-        for row in customers_rows:
-            customers.append({
-                'customer_id': row['customer_id'],
-                'customer_name': row['customer_name'],
-                'email': row['email'],
-                'phone': row['phone'],
-                'created_at': row['created_at'].isoformat()
-            })
-        
-        logger.info(f"✅ Exported {len(customers)} customers")
-        
-        # Export orders with items
-        logger.info("Exporting orders...")
-        orders_rows = await conn.fetch("""
-            SELECT order_id, customer_id, store_id, order_date, total_amount
-            FROM retail.orders
-            ORDER BY order_id
-        """)
-        
-        orders = []
-        for order_row in orders_rows:
-            # Get order items
-            items_rows = await conn.fetch("""
-                SELECT product_id, quantity, unit_price, discount_percent
-                FROM retail.order_items
-                WHERE order_id = $1
-                ORDER BY order_item_id
-            """, order_row['order_id'])
-            
-            items = []
-            for item_row in items_rows:
-                items.append({
-                    'product_id': item_row['product_id'],
-                    'quantity': item_row['quantity'],
-                    'unit_price': float(item_row['unit_price']),
-                    'discount_percent': float(item_row['discount_percent'])
-                })
-            
-            orders.append({
-                'customer_id': order_row['customer_id'],
-                'store_id': order_row['store_id'],
-                'order_date': order_row['order_date'].isoformat(),
-                'total_amount': float(order_row['total_amount']),
-                'items': items
-            })
-        
-        logger.info(f"✅ Exported {len(orders)} orders")
-        
-        # Save to files
-        data_dir = Path(__file__).parent
-        customers_file = data_dir / 'customers_pregenerated.json'
-        orders_file = data_dir / 'orders_pregenerated.json'
-        
-        logger.info(f"Writing {customers_file}...")
-        with open(customers_file, 'w') as f:
-            json.dump(customers, f, indent=2)
-        
-        logger.info(f"Writing {orders_file}...")
-        with open(orders_file, 'w') as f:
-            json.dump(orders, f, indent=2)
-        
-        # Get file sizes
-        customers_size = customers_file.stat().st_size / 1024 / 1024
-        orders_size = orders_file.stat().st_size / 1024 / 1024
-        
-        logger.info("=" * 60)
-        logger.info("✅ Export completed successfully!")
-        logger.info(f"📦 customers_pregenerated.json: {customers_size:.2f} MB")
-        logger.info(f"📦 orders_pregenerated.json: {orders_size:.2f} MB")
-        logger.info(f"📦 Total: {customers_size + orders_size:.2f} MB")
-        logger.info("=" * 60)
-        logger.info("")
-        logger.info("These files can now be committed to the repository.")
-        logger.info("Next time generate_database.py runs, it will auto-detect")
-        logger.info("and load from these files for instant setup!")
-        
+
+        # Newline-delimited JSON: no pretty-print whitespace, no array
+        # framing, and the loader can stream it line by line
+        customers_file = DATA_DIR / 'customers_pregenerated.ndjson.gz'
+        orders_file = DATA_DIR / 'orders_pregenerated.ndjson.gz'
+
+        logger.info("Exporting customers and orders...")
+        (customer_count, customers_bytes), (order_count, orders_bytes) = (
+            await asyncio.gather(
+                export_customers(pool, customers_file),
+                export_orders(pool, orders_file),
+            )
+        )
+
+        logger.info(_BAR)
+        # Single summary line with %-style args so formatting is skipped
+        # entirely when INFO is disabled
+        logger.info(
+            "✅ Export complete: %d customers (%.2f MB), %d orders (%.2f MB)",
+            customer_count,
+            customers_bytes / 1024 / 1024,
+            order_count,
+            orders_bytes / 1024 / 1024,
+        )
+        logger.info(_BAR)
+        logger.info(
+            "Commit %s and %s; generate_database.py auto-detects and loads them.",
+            customers_file.name,
+            orders_file.name,
+        )
+
     except Exception as e:
-        logger.error(f"❌ Export failed: {e}")
+        logger.error("❌ Export failed: %s", e)
         sys.exit(1)
     finally:
-        if conn:
-            await conn.close()
+        if pool:
+            await pool.close()
             logger.info("Connection closed")
 
 
 if __name__ == '__main__':
+    try:
+        # uvloop roughly halves asyncpg protocol overhead; the agent
+        # already pulls it in via uvicorn[standard], but it stays
+        # optional for this standalone script
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(export_data())
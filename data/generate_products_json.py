@@ -1,106 +1,132 @@
 #!/usr/bin/env python3
 """
-Generate products_pregenerated.json from product_data.json
+Generate products_pregenerated.ndjson.gz from product_data.json
 
 This script extracts products from the nested product_data.json structure
-and creates a flat, pre-processed JSON file for fast database loading.
+and creates a flat, pre-processed data file for fast database loading.
 """
 
-import json
+import gzip
 from pathlib import Path
 
+import ijson
+import numpy as np
+import orjson
+
+
+def iter_products(product_data_file: Path):
+    """Stream flattened product records out of product_data.json.
+
+    ijson yields one category at a time, so peak memory is one
+    category's products (embeddings included) instead of the whole
+    nested document at several times its on-disk size.
+    """
+    product_count = 0
+
+    with open(product_data_file, 'rb') as f:
+        for category_name, category_data in ijson.kvitems(
+            f, 'main_categories', use_float=True
+        ):
+            for product_type_name, product_list in category_data.items():
+                # Skip seasonal multipliers and non-list values
+                if product_type_name == 'washington_seasonal_multipliers':
+                    continue
+                if not isinstance(product_list, list):
+                    continue
+
+                for product in product_list:
+                    if not isinstance(product, dict):
+                        continue
+
+                    product_count += 1
+
+                    # Calculate selling price from cost for 33% gross margin
+                    cost = float(product.get('price', 0))  # JSON price is the cost
+                    base_price = round(cost / 0.67, 2)  # Selling price = Cost / (1 - 0.33)
+
+                    # Create flattened product record
+                    product_record = {
+                        'sku': product.get('sku', f"SKU-{product_count:06d}"),
+                        'product_name': product.get('name'),
+                        'product_description': product.get('description'),
+                        'category_name': category_name,
+                        'type_name': product_type_name,
+                        'cost': cost,
+                        'base_price': base_price,
+                        'gross_margin_percent': 33.0
+                    }
+
+                    # Add embeddings if available. Each one becomes a
+                    # float32 NumPy array immediately: a quarter of the
+                    # memory of a PyFloat list, shape-checked for free,
+                    # and serialized natively by orjson at write time.
+                    if 'image_embedding' in product and product['image_embedding']:
+                        embedding = np.asarray(
+                            product['image_embedding'], dtype=np.float32
+                        )
+                        if embedding.shape == (512,):
+                            product_record['image_embedding'] = embedding
+                            product_record['image_path'] = product.get('image_path', '')
+
+                    if 'description_embedding' in product and product['description_embedding']:
+                        embedding = np.asarray(
+                            product['description_embedding'], dtype=np.float32
+                        )
+                        if embedding.shape == (1536,):
+                            product_record['description_embedding'] = embedding
+
+                    yield product_record
+
+                    if product_count % 100 == 0:
+                        print(f"  Processed {product_count} products...")
+
 
 def generate_products_json():
     """Extract products from product_data.json and save to products_pregenerated.json."""
-    
+
     data_dir = Path(__file__).parent
     product_data_file = data_dir / 'product_data.json'
-    output_file = data_dir / 'products_pregenerated.json'
-    
+    output_file = data_dir / 'products_pregenerated.ndjson.gz'
+
     print("=" * 60)
     print("Generate Pre-Generated Products JSON")
     print("=" * 60)
-    
-    # Load product data
+
     print(f"\nLoading {product_data_file}...")
-    with open(product_data_file) as f:
-        product_data = json.load(f)
-    
-    main_categories = product_data.get('main_categories', {})
-    
-    # Extract all products into flat list
-    products = []
-    product_count = 0
-    
-    for category_name, category_data in main_categories.items():
-        for product_type_name, product_list in category_data.items():
-            # Skip seasonal multipliers and non-list values
-            if product_type_name == 'washington_seasonal_multipliers':
-                continue
-            if not isinstance(product_list, list):
-                continue
-            
-            for product in product_list:
-                if not isinstance(product, dict):
-                    continue
-                
-                product_count += 1
-                
-                # Calculate selling price from cost for 33% gross margin
-                cost = float(product.get('price', 0))  # JSON price is the cost
-                base_price = round(cost / 0.67, 2)  # Selling price = Cost / (1 - 0.33)
-                
-                # Create flattened product record
-                product_record = {
-                    'sku': product.get('sku', f"SKU-{product_count:06d}"),
-                    'product_name': product.get('name'),
-                    'product_description': product.get('description'),
-                    'category_name': category_name,
-                    'type_name': product_type_name,
-                    'cost': cost,
-                    'base_price': base_price,
-                    'gross_margin_percent': 33.0
-                }
-                
-                # Add embeddings if available
-                if 'image_embedding' in product and product['image_embedding']:
-                    embedding = product['image_embedding']
-                    if isinstance(embedding, list) and len(embedding) == 512:
-                        product_record['image_embedding'] = embedding
-                        product_record['image_path'] = product.get('image_path', '')
-                
-                if 'description_embedding' in product and product['description_embedding']:
-                    embedding = product['description_embedding']
-                    if isinstance(embedding, list) and len(embedding) == 1536:
-                        product_record['description_embedding'] = embedding
-                
-                products.append(product_record)
-                
-                if product_count % 100 == 0:
-                    print(f"  Processed {product_count} products...")
-    
-    # Save to JSON file
-    print(f"\nWriting {len(products)} products to {output_file}...")
-    with open(output_file, 'w') as f:
-        json.dump(products, f, indent=2)
-    
+
+    # Write each record as it streams through, so neither the input
+    # document nor the output list is ever fully in memory. Gzipped
+    # NDJSON matches what export_sales_data.py emits and what
+    # generate_database.py auto-detects; gzip shrinks the ASCII floats
+    # roughly 10x, keeping the file well inside GitHub's limits.
+    # mtime=0 makes re-runs byte-identical.
+    print(f"\nWriting products to {output_file}...")
+    count = 0
+    with open(output_file, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0) as f:
+            for record in iter_products(product_data_file):
+                # orjson serializes the float32 embedding arrays in C
+                f.write(orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY))
+                f.write(b'\n')
+                count += 1
+
     # Report file size
     file_size_mb = output_file.stat().st_size / (1024 * 1024)
-    
+
     print("\n" + "=" * 60)
     print("Summary")
     print("=" * 60)
-    print(f"Products extracted: {len(products)}")
+    print(f"Products extracted: {count}")
     print(f"Output file: {output_file.name}")
     print(f"File size: {file_size_mb:.2f} MB")
-    
+
     if file_size_mb > 100:
         print("❌ Error: File size exceeds GitHub's 100 MB limit")
     elif file_size_mb > 50:
         print("⚠️  Warning: File size exceeds GitHub's 50 MB recommendation")
     else:
         print("✅ File size is safe for GitHub")
-    
+
     print("=" * 60)
 
 
@@ -8,15 +8,22 @@ This script updates the embeddings in the database to match the model being used
 import asyncio
 import logging
 import os
+import random
 import sys
 from pathlib import Path
 
 import asyncpg
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+from azure.identity import (
+    AzureCliCredential,
+    ChainedTokenCredential,
+    ManagedIdentityCredential,
+    get_bearer_token_provider,
+)
+from pgvector.asyncpg import register_vector
 
 # Load environment variables
 from dotenv import load_dotenv
-from openai import AsyncAzureOpenAI
+from openai import AsyncAzureOpenAI, BadRequestError, RateLimitError
 
 env_path = Path(__file__).parent.parent / ".env.local"
 load_dotenv(env_path)
@@ -43,8 +50,13 @@ async def regenerate_embeddings():
     logger.info(f"Using endpoint: {endpoint}")
     logger.info(f"Using embedding model: {embedding_model}")
 
-    # Initialize Azure OpenAI client
-    credential = DefaultAzureCredential()
+    # Initialize Azure OpenAI client. The explicit chain skips
+    # DefaultAzureCredential's full credential probe, and MSAL's token
+    # cache means one token fetch serves the whole run.
+    credential = ChainedTokenCredential(
+        ManagedIdentityCredential(client_id=os.environ.get("AZURE_CLIENT_ID")),
+        AzureCliCredential(),
+    )
     token_provider = get_bearer_token_provider(
         credential, "https://cognitiveservices.azure.com/.default"
     )
@@ -53,112 +65,146 @@ async def regenerate_embeddings():
         api_version="2024-10-21",
         azure_endpoint=endpoint,
         azure_ad_token_provider=token_provider,
+        max_retries=3,
     )
 
-    # Connect to database
+    # One pool serves the whole script - upserts and the verification
+    # query - instead of paying TCP + auth for a fresh connection twice
     logger.info("Connecting to database...")
-    conn = await asyncpg.connect(
+    pool = await asyncpg.create_pool(
         user="postgres",
         password="postgres",
         host="localhost",
         port=5432,
         database="zava",
+        min_size=2,
+        max_size=4,
+        # Binary pgvector codec on every pooled connection: embeddings
+        # go over the wire packed instead of as ~20KB text literals
+        init=register_vector,
     )
 
     # Get all products with their descriptions
     logger.info("Fetching products...")
-    products = await conn.fetch("""
-        SELECT product_id, product_name, product_description 
-        FROM retail.products 
-        ORDER BY product_id
-    """)
+    async with pool.acquire() as conn:
+        products = await conn.fetch("""
+            SELECT product_id, product_name, product_description
+            FROM retail.products
+            ORDER BY product_id
+        """)
 
     logger.info(f"Found {len(products)} products to process")
 
-    # Process in batches of 20 (Azure OpenAI limit)
-    batch_size = 20
+    # Process in batches (some Azure embedding deployments cap inputs at
+    # 16), keeping several embedding requests in flight while completed
+    # batches stream into the database - neither the API nor Postgres
+    # sits idle waiting for the other. The semaphore bounds in-flight
+    # calls to stay under the Azure rate limit.
+    batch_size = int(os.environ.get("EMBED_BATCH_SIZE", "16"))
+    max_in_flight = 8
     updated = 0
 
-    for i in range(0, len(products), batch_size):
-        batch = products[i : i + batch_size]
-
-        # Prepare texts for embedding
-        texts = []
-        product_ids = []
-        for p in batch:
-            # Combine name and description for better semantic matching
-            text = f"{p['product_name']}: {p['product_description'] or ''}"
-            texts.append(text)
-            product_ids.append(p["product_id"])
+    sem = asyncio.Semaphore(max_in_flight)
 
-        # Get embeddings for batch
+    async def embed_with_retry(texts: list, attempt: int = 0) -> list:
+        """Embed a batch, backing off on 429s and splitting batches the
+        deployment rejects as too large instead of aborting the run."""
         try:
             response = await client.embeddings.create(
                 input=texts, model=embedding_model
             )
-
-            # Update each product's embedding
-            for j, embedding_data in enumerate(response.data):
-                embedding = embedding_data.embedding
-                product_id = product_ids[j]
-
-                embedding_str = "[" + ",".join(map(str, embedding)) + "]"
-
-                # Update or insert the embedding
-                await conn.execute(
-                    """
-                    INSERT INTO retail.product_description_embeddings (product_id, description_embedding)
-                    VALUES ($1, $2::vector)
-                    ON CONFLICT (product_id) DO UPDATE SET
-                        description_embedding = EXCLUDED.description_embedding
-                """,
-                    product_id,
-                    embedding_str,
+            return [d.embedding for d in response.data]
+        except RateLimitError:
+            if attempt >= 6:
+                raise
+            delay = min(2**attempt, 30) + random.random()
+            logger.warning(f"Rate limited; retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            return await embed_with_retry(texts, attempt + 1)
+        except BadRequestError as e:
+            if len(texts) > 1 and "inputs" in str(e).lower():
+                mid = len(texts) // 2
+                return await embed_with_retry(texts[:mid]) + await embed_with_retry(
+                    texts[mid:]
                 )
+            raise
+
+    async def embed_batch(product_ids: list, texts: list):
+        async with sem:
+            embeddings = await embed_with_retry(texts)
+        return product_ids, embeddings
 
-                updated += 1
+    tasks = []
+    for i in range(0, len(products), batch_size):
+        batch = products[i : i + batch_size]
 
-            logger.info(f"Processed {updated}/{len(products)} products...")
+        # Combine name and description for better semantic matching
+        texts = [
+            f"{p['product_name']}: {p['product_description'] or ''}" for p in batch
+        ]
+        product_ids = [p["product_id"] for p in batch]
+        tasks.append(asyncio.create_task(embed_batch(product_ids, texts)))
 
+    for task in asyncio.as_completed(tasks):
+        try:
+            product_ids, embeddings = await task
         except Exception as e:
             logger.error(f"Error processing batch: {e}")
             raise
 
-    await conn.close()
+        # Upsert the whole batch in one executemany round trip
+        # instead of one INSERT per product
+        records = list(zip(product_ids, embeddings))
+        async with pool.acquire() as conn:
+            await conn.executemany(
+                """
+                INSERT INTO retail.product_description_embeddings (product_id, description_embedding)
+                VALUES ($1, $2::halfvec)
+                ON CONFLICT (product_id) DO UPDATE SET
+                    description_embedding = EXCLUDED.description_embedding
+            """,
+                records,
+            )
+
+        updated += len(records)
+
+        logger.info(f"Processed {updated}/{len(products)} products...")
+
     logger.info(f"✅ Successfully regenerated {updated} embeddings!")
 
     # Verify by testing a search
     logger.info("\nVerifying with test search for 'hammers'...")
-    conn = await asyncpg.connect(
-        user="postgres",
-        password="postgres",
-        host="localhost",
-        port=5432,
-        database="zava",
-    )
 
     # Get embedding for 'hammers'
     response = await client.embeddings.create(input="hammers", model=embedding_model)
     query_embedding = response.data[0].embedding
-    embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
-
-    results = await conn.fetch(
-        """
-        SELECT p.product_name, 1 - (de.description_embedding <=> $1::vector) as similarity 
-        FROM retail.products p 
-        JOIN retail.product_description_embeddings de ON p.product_id = de.product_id 
-        ORDER BY similarity DESC
-        LIMIT 10;
-    """,
-        embedding_str,
-    )
+
+    async with pool.acquire() as conn:
+        results = await conn.fetch(
+            """
+            SELECT p.product_name, 1 - (de.description_embedding <=> $1::halfvec) as similarity
+            FROM retail.products p
+            JOIN retail.product_description_embeddings de ON p.product_id = de.product_id
+            ORDER BY similarity DESC
+            LIMIT 10;
+        """,
+            query_embedding,
+        )
 
     logger.info("Top 10 products by similarity to 'hammers':")
     for row in results:
         logger.info(f"  {row['similarity']:.4f} - {row['product_name']}")
 
-    await conn.close()
+    await pool.close()
 
 
 if __name__ == "__main__":
+    try:
+        # libuv event loop: cheaper dispatch for the thousands of small
+        # awaits the batch pipeline fires
+        import uvloop
+
+        uvloop.install()
+    except ImportError:  # uvloop is Linux/macOS only
+        pass
     asyncio.run(regenerate_embeddings())